@@ -0,0 +1,34 @@
+"""Endpoints used by the benchmarks in addition to the sample BooksEndpoint.
+Must be imported after harness.setup_paths().
+"""
+
+import restapp
+from restapp import blobs
+from restapp import facebook
+import sample
+import harness
+
+class AuthBooksEndpoint(facebook.AuthenticatedEndpoint, sample.BooksEndpoint):
+    """The sample endpoint, authenticated with facebook"""
+    root_url = '/authbooks'
+
+class BlobstoreEndpoint(restapp.Endpoint):
+    """Serves blobs from the blobstore (the default blob store) with '?alt=blob'"""
+    root_url = '/blobstore'
+
+    def get(self, ctx):
+        return ctx.resource_path
+
+    def alt_blob(self, ctx, blob_key):
+        ctx.send_blob(blob_key)
+
+class BlobsEndpoint(restapp.Endpoint):
+    """Serves blobs from a local blob store with '?alt=blob'"""
+    root_url = '/blobs'
+    blob_store = blobs.FileSystemBlobStore(harness.temp_dir())
+
+    def get(self, ctx):
+        return ctx.resource_path
+
+    def alt_blob(self, ctx, blob_key):
+        ctx.send_blob(blob_key)
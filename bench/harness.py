@@ -0,0 +1,119 @@
+"""Helpers for running restapp in-process with local stand-ins for the App Engine services.
+
+Requires the App Engine SDK. Its location is taken from the GOOGLE_APP_ENGINE
+environment variable (/usr/local/google_appengine by default).
+"""
+
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+import StringIO
+
+APP_ID = 'restappsample'
+
+# the blob storage of the blobstore stub (see create_blob)
+blob_storage = None
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+def setup_paths(sdk_dir = None):
+    """Adds the SDK, its libraries and the application sources to sys.path
+    Args:
+        sdk_dir - The directory of the App Engine SDK
+    """
+    sdk_dir = sdk_dir or os.environ.get('GOOGLE_APP_ENGINE', '/usr/local/google_appengine')
+    sys.path[0:0] = [ sdk_dir,
+                      os.path.join(sdk_dir, 'lib', 'django'),
+                      os.path.join(sdk_dir, 'lib', 'webob'),
+                      os.path.join(sdk_dir, 'lib', 'yaml', 'lib'),
+                      os.path.abspath(SRC_DIR) ]
+
+def setup_stubs():
+    """Registers local stubs for the datastore, memcache, urlfetch and blobstore"""
+    from google.appengine.api import apiproxy_stub_map
+    from google.appengine.api import datastore_file_stub
+    from google.appengine.api.memcache import memcache_stub
+    from google.appengine.api.blobstore import blobstore_stub
+    from google.appengine.api.blobstore import file_blob_storage
+
+    os.environ['APPLICATION_ID'] = APP_ID
+    os.environ['AUTH_DOMAIN'] = 'gmail.com'
+    os.environ['SERVER_NAME'] = 'localhost'
+    os.environ['SERVER_PORT'] = '80'
+    os.environ['CURRENT_VERSION_ID'] = '1.1'
+    os.environ['USER_EMAIL'] = ''
+
+    apiproxy_stub_map.apiproxy = apiproxy_stub_map.APIProxyStubMap()
+    apiproxy_stub_map.apiproxy.RegisterStub('datastore_v3', datastore_file_stub.DatastoreFileStub(APP_ID, None, None))
+    apiproxy_stub_map.apiproxy.RegisterStub('memcache', memcache_stub.MemcacheServiceStub())
+    apiproxy_stub_map.apiproxy.RegisterStub('urlfetch', _graph_urlfetch_stub())
+    global blob_storage
+    blob_storage = file_blob_storage.FileBlobStorage(temp_dir(), APP_ID)
+    apiproxy_stub_map.apiproxy.RegisterStub('blobstore', blobstore_stub.BlobstoreServiceStub(blob_storage))
+
+def temp_dir():
+    """Creates a temporary directory that is removed when the process exits"""
+    path = tempfile.mkdtemp(prefix = 'restapp-bench-')
+    atexit.register(shutil.rmtree, path, True)
+    return path
+
+def create_blob(blob_key, data, content_type = 'application/octet-stream'):
+    """Stores a blob (and its BlobInfo) in the blobstore stub"""
+    import datetime
+    from google.appengine.api import datastore
+    from google.appengine.ext import blobstore
+
+    blob_storage.StoreBlob(blob_key, StringIO.StringIO(data))
+    info = datastore.Entity(blobstore.BLOB_INFO_KIND, name = blob_key)
+    info['content_type'] = content_type
+    info['creation'] = datetime.datetime.utcnow()
+    info['filename'] = blob_key
+    info['size'] = len(data)
+    datastore.Put(info)
+
+def _graph_urlfetch_stub():
+    """Returns a urlfetch stub that answers every fetch like the facebook graph 'me' URL.
+    The user id is derived from the access token, so every token is a different user.
+    """
+    import cgi
+    import urlparse
+    from google.appengine.api import apiproxy_stub
+
+    class GraphUrlFetchStub(apiproxy_stub.APIProxyStub):
+        def _Dynamic_Fetch(self, request, response):
+            query = cgi.parse_qs(urlparse.urlparse(request.url())[4])
+            token = query.get('access_token', [ 'anonymous' ])[0]
+            response.set_statuscode(200)
+            response.set_content('{"id": "%d", "name": "Bench User"}' % (abs(hash(token)) % 1000000))
+
+    return GraphUrlFetchStub('urlfetch')
+
+def request(app, method, path, body = '', headers = None):
+    """Sends a request to a WSGI application in-process.
+    Args:
+        app - The WSGI application
+        method - The HTTP method
+        path - The path of the request (with a query string)
+        body - The request body
+        headers - A dictionary of request headers
+    Returns:
+        A (status, headers, body) tuple. headers is a dictionary.
+    """
+    import webob
+    environ = webob.Request.blank(path).environ
+    environ['REQUEST_METHOD'] = method
+    environ['wsgi.input'] = StringIO.StringIO(body)
+    environ['CONTENT_LENGTH'] = str(len(body))
+    for name, value in (headers or {}).items():
+        key = name.upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'): key = 'HTTP_' + key
+        environ[key] = value
+
+    result = {}
+    def start_response(status, response_headers, exc_info = None):
+        result['status'] = status
+        result['headers'] = response_headers
+
+    output = ''.join(app(environ, start_response))
+    return int(result['status'].split(' ')[0]), dict(result['headers']), output
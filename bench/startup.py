@@ -0,0 +1,76 @@
+"""Measures the cold start of the sample endpoint: the time it takes a fresh instance
+to import the application and serve its first response, with and without a warmup request.
+
+Every run is a new interpreter. Times are measured from the start of the script (after
+the interpreter itself has started) and the median of all runs is reported.
+
+Usage: python bench/startup.py [--runs N]
+"""
+
+import os
+import sys
+import time
+import subprocess
+from optparse import OptionParser
+
+SCENARIOS = [ ('json', '/books?alt=json', False),
+              ('json+warmup', '/books?alt=json', True),
+              ('html', '/books', False),
+              ('html+warmup', '/books', True) ]
+
+def child(path, warmup):
+    """Runs in a fresh interpreter and prints the timings of a single cold start"""
+    t0 = time.time()
+    import harness
+    harness.setup_paths()
+    harness.setup_stubs()
+    t_stubs = time.time()
+
+    import restapp
+    import sample
+    app = restapp.wsgi_restapp(sample.BooksEndpoint)
+    t_import = time.time()
+
+    if warmup:
+        status, headers, body = harness.request(app, 'GET', '/_ah/warmup')
+        assert status == 200, 'warmup failed with %d' % status
+    t_warmup = time.time()
+
+    status, headers, body = harness.request(app, 'GET', path)
+    assert status == 200, 'request failed with %d: %s' % (status, body)
+    t_response = time.time()
+
+    # the instance serves traffic only after the warmup request, so it is not part of the first response
+    print '%f %f %f %f' % (t_stubs - t0, t_import - t_stubs, t_warmup - t_import, t_response - t_warmup)
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) / 2]
+
+def main():
+    parser = OptionParser(usage = 'usage: %prog [--runs N]')
+    parser.add_option('--runs', type = 'int', default = 10, help = 'number of cold starts per scenario')
+    parser.add_option('--child', help = 'internal: run a single cold start of the given scenario')
+    options, args = parser.parse_args()
+
+    if options.child:
+        for name, path, warmup in SCENARIOS:
+            if name == options.child:
+                child(path, warmup)
+        return
+
+    print '%-12s %10s %10s %10s %16s' % ('scenario', 'stubs ms', 'import ms', 'warmup ms', 'first resp. ms')
+    for name, path, warmup in SCENARIOS:
+        samples = []
+        for i in range(options.runs):
+            process = subprocess.Popen([ sys.executable, os.path.abspath(__file__), '--child', name ],
+                                       stdout = subprocess.PIPE)
+            output = process.communicate()[0]
+            if process.returncode != 0:
+                sys.exit('cold start of %s failed' % name)
+            samples.append([ float(v) * 1000 for v in output.split()[-4:] ])
+
+        print '%-12s %10.1f %10.1f %10.1f %16.1f' % ((name,) + tuple([ median([ s[i] for s in samples ]) for i in range(4) ]))
+
+if __name__ == '__main__':
+    main()
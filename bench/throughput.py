@@ -0,0 +1,240 @@
+"""End-to-end benchmarks of the restapp request path.
+
+Drives the WSGI applications of the sample endpoints in-process, with local stubs for the
+datastore, memcache, urlfetch and blobstore (see harness.py). Every scenario runs in a fresh
+interpreter so that its memory is measured in isolation. Besides the peak memory of the process
+(which includes the SDK and the stubs with their data), the growth of the resident memory while
+requests are sent is reported.
+
+Usage:
+    python bench/throughput.py [--requests N] [--only NAME,...] [--save FILE] [--compare FILE]
+
+--save stores the results as JSON. --compare reports the change from a saved run and exits
+with a non-zero status if req/s or p99 latency regressed by more than --threshold percent.
+"""
+
+import os
+import gc
+import sys
+import math
+import time
+import subprocess
+from optparse import OptionParser
+
+import harness
+
+# requests sent before measuring (fills caches and loads lazily imported modules)
+WARMUP_REQUESTS = 5
+
+# minimum number of measured requests per scenario, so that p99 is not taken from a handful of samples
+MIN_REQUESTS = 100
+
+class Scenario(object):
+    """A benchmark scenario
+    Properties:
+        name - The name of the scenario
+        endpoint - The name of the endpoint class ('sample.BooksEndpoint' or one of the 'endpoints' module)
+        method - The HTTP method
+        path - The request path. '%(i)d' is replaced with the index of the request.
+        entities - Number of books in the datastore
+        weight - The number of requests sent is divided by this for slow scenarios (down to MIN_REQUESTS)
+        body - The request body ('%(i)d' is replaced as well)
+        headers - Request headers
+        status - The expected response status
+    """
+    def __init__(self, name, endpoint, method, path, entities = 0, weight = 1, body = '', headers = None, status = 200):
+        self.name = name
+        self.endpoint = endpoint
+        self.method = method
+        self.path = path
+        self.entities = entities
+        self.weight = weight
+        self.body = body
+        self.headers = headers or {}
+        self.status = status
+
+def _scenarios():
+    scenarios = []
+    for alt in ('json', 'jsonp', 'html'):
+        scenarios.append(Scenario('get_%s' % alt, 'sample.BooksEndpoint', 'GET', _alt_path('/books/isbn-1', alt), entities = 1))
+    for entities, weight, label in ((10, 1, '10'), (1000, 20, '1k'), (10000, 200, '10k')):
+        for alt in ('json', 'jsonp', 'html'):
+            scenarios.append(Scenario('query_%s_%s' % (label, alt), 'sample.BooksEndpoint', 'GET', _alt_path('/books', alt),
+                                      entities = entities, weight = weight))
+    scenarios.append(Scenario('post', 'sample.BooksEndpoint', 'POST', '/books',
+                              body = 'isbn=post-%(i)d&title=Title&author=Author&publish_year=2011',
+                              headers = { 'Content-Type': 'application/x-www-form-urlencoded' }, status = 302))
+    scenarios.append(Scenario('auth_get_json', 'endpoints.AuthBooksEndpoint', 'GET',
+                              '/authbooks/isbn-1?alt=json&fb_access_token=token', entities = 1))
+    scenarios.append(Scenario('auth_get_json_new_token', 'endpoints.AuthBooksEndpoint', 'GET',
+                              '/authbooks/isbn-1?alt=json&fb_access_token=token-%(i)d', entities = 1))
+    # blobstore blobs are sent by the serving infrastructure, so these measure the work left to the instance
+    scenarios.append(Scenario('blobstore_get', 'endpoints.BlobstoreEndpoint', 'GET', '/blobstore/media?alt=blob'))
+    scenarios.append(Scenario('blobstore_range', 'endpoints.BlobstoreEndpoint', 'GET', '/blobstore/media?alt=blob',
+                              headers = { 'Range': 'bytes=65536-131071' }, status = 206))
+    scenarios.append(Scenario('blob_get', 'endpoints.BlobsEndpoint', 'GET', '/blobs/media.bin?alt=blob'))
+    scenarios.append(Scenario('blob_range', 'endpoints.BlobsEndpoint', 'GET', '/blobs/media.bin?alt=blob',
+                              headers = { 'Range': 'bytes=65536-131071' }, status = 206))
+    return scenarios
+
+def _alt_path(path, alt):
+    if alt == 'jsonp': return path + '?alt=jsonp&callback=cb'
+    return path + '?alt=' + alt
+
+SCENARIOS = _scenarios()
+
+def percentile(sorted_values, p):
+    """Returns the p-th percentile (nearest rank) of a sorted list"""
+    index = int(math.ceil(p / 100.0 * len(sorted_values))) - 1
+    return sorted_values[max(0, min(index, len(sorted_values) - 1))]
+
+def peak_memory_mb():
+    """Returns the peak resident memory of this process in MB"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin': return peak / (1024.0 * 1024.0) # bytes
+    return peak / 1024.0 # kilobytes
+
+def resident_memory_mb():
+    """Returns the current resident memory of this process in MB (the peak if /proc is not available)"""
+    try:
+        f = open('/proc/self/statm')
+        try:
+            pages = int(f.read().split()[1])
+        finally:
+            f.close()
+    except (IOError, IndexError, ValueError):
+        return peak_memory_mb()
+    return pages * os.sysconf('SC_PAGE_SIZE') / (1024.0 * 1024.0)
+
+def child(scenario, requests):
+    """Runs a single scenario in this interpreter and prints its results as JSON"""
+    harness.setup_paths()
+    harness.setup_stubs()
+
+    from google.appengine.ext import db
+    from django.utils import simplejson as json
+    import restapp
+    import sample
+    import endpoints
+
+    module, class_name = scenario.endpoint.split('.')
+    endpoint_class = getattr({ 'sample': sample, 'endpoints': endpoints }[module], class_name)
+    app = restapp.wsgi_restapp(endpoint_class)
+
+    # populate the datastore and the blob store
+    books = [ sample.Book(key_name = 'isbn-%d' % i, title = 'Title %d' % i, author = 'Author %d' % i, publish_year = 2011)
+              for i in range(scenario.entities) ]
+    for i in range(0, len(books), 500):
+        db.put(books[i:i + 500])
+    if endpoint_class is endpoints.BlobsEndpoint:
+        blob = open(endpoint_class.blob_store.path('media.bin'), 'wb')
+        blob.write(os.urandom(1024 * 1024))
+        blob.close()
+    if endpoint_class is endpoints.BlobstoreEndpoint:
+        harness.create_blob('media', os.urandom(1024 * 1024))
+    del books
+    gc.collect()
+
+    # memory used by the SDK, the stubs and their data is not attributed to the request path
+    base_mem = resident_memory_mb()
+    count = max(MIN_REQUESTS, requests / scenario.weight)
+    latencies = []
+    start = None
+    for i in range(WARMUP_REQUESTS + count):
+        if i == WARMUP_REQUESTS: start = time.time()
+        t = time.time()
+        status, headers, body = harness.request(app, scenario.method, scenario.path % { 'i': i },
+                                                body = scenario.body % { 'i': i }, headers = scenario.headers)
+        if i >= WARMUP_REQUESTS: latencies.append(time.time() - t)
+        if status != scenario.status:
+            sys.exit('%s: expected status %d, got %d: %s' % (scenario.name, scenario.status, status, body[:200]))
+    elapsed = time.time() - start
+    mem_growth = resident_memory_mb() - base_mem
+
+    latencies.sort()
+    print json.dumps({ 'requests': count,
+                       'req_per_sec': count / elapsed,
+                       'p50_ms': percentile(latencies, 50) * 1000,
+                       'p90_ms': percentile(latencies, 90) * 1000,
+                       'p99_ms': percentile(latencies, 99) * 1000,
+                       'peak_mem_mb': peak_memory_mb(),
+                       'mem_growth_mb': mem_growth })
+
+def compare(results, baseline, threshold):
+    """Prints the change of every scenario from a baseline run. The memory growth of a scenario is usually
+    small, so its change is printed in MB rather than in percent.
+    Returns:
+        The names of scenarios that regressed by more than 'threshold' percent.
+    """
+    regressions = []
+    print
+    print '%-26s %12s %12s %12s %12s' % ('change from baseline', 'req/s', 'p99', 'peak mem', 'growth MB')
+    for scenario in SCENARIOS:
+        if scenario.name not in results or scenario.name not in baseline:
+            continue
+        new, old = results[scenario.name], baseline[scenario.name]
+        changes = [ 100.0 * (new[k] - old[k]) / old[k] for k in ('req_per_sec', 'p99_ms', 'peak_mem_mb') ]
+        regressed = changes[0] < -threshold or changes[1] > threshold
+        if regressed: regressions.append(scenario.name)
+        growth = new.get('mem_growth_mb', 0) - old.get('mem_growth_mb', 0)
+        print '%-26s %+11.1f%% %+11.1f%% %+11.1f%% %+12.1f%s' % ((scenario.name,) + tuple(changes) + (growth, regressed and '  REGRESSION' or ''))
+    return regressions
+
+def main():
+    parser = OptionParser(usage = 'usage: %prog [--requests N] [--only NAME,...] [--save FILE] [--compare FILE]')
+    parser.add_option('--requests', type = 'int', default = 1000, help = 'number of requests per scenario (divided for slow scenarios)')
+    parser.add_option('--only', help = 'comma separated names of the scenarios to run')
+    parser.add_option('--save', help = 'save the results as JSON into this file')
+    parser.add_option('--compare', help = 'compare the results to a file saved with --save')
+    parser.add_option('--threshold', type = 'float', default = 10.0, help = 'regression threshold in percent (default: 10)')
+    parser.add_option('--child', help = 'internal: run a single scenario in this interpreter')
+    options, args = parser.parse_args()
+
+    scenarios = dict([ (s.name, s) for s in SCENARIOS ])
+    if options.child:
+        child(scenarios[options.child], options.requests)
+        return
+
+    harness.setup_paths()
+    from django.utils import simplejson as json
+
+    names = [ s.name for s in SCENARIOS ]
+    if options.only:
+        names = options.only.split(',')
+        for name in names:
+            if name not in scenarios: sys.exit('unknown scenario: %s' % name)
+
+    results = {}
+    print '%-26s %8s %10s %9s %9s %9s %10s %10s' % ('scenario', 'requests', 'req/s', 'p50 ms', 'p90 ms', 'p99 ms', 'peak MB', 'growth MB')
+    for name in names:
+        process = subprocess.Popen([ sys.executable, os.path.abspath(__file__), '--child', name, '--requests', str(options.requests) ],
+                                   stdout = subprocess.PIPE)
+        output = process.communicate()[0]
+        if process.returncode != 0:
+            sys.exit('scenario %s failed' % name)
+        result = json.loads(output.strip().splitlines()[-1])
+        results[name] = result
+        print '%-26s %8d %10.1f %9.2f %9.2f %9.2f %10.1f %10.1f' % (name, result['requests'], result['req_per_sec'],
+                                                                     result['p50_ms'], result['p90_ms'], result['p99_ms'],
+                                                                     result['peak_mem_mb'], result['mem_growth_mb'])
+
+    if options.save:
+        f = open(options.save, 'w')
+        try:
+            f.write(json.dumps(results, indent = 4, sort_keys = True))
+        finally:
+            f.close()
+
+    if options.compare:
+        f = open(options.compare)
+        try:
+            baseline = json.loads(f.read())
+        finally:
+            f.close()
+        regressions = compare(results, baseline, options.threshold)
+        if regressions:
+            sys.exit('regressions: %s' % ', '.join(regressions))
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,15 @@
 import os
+import inspect
 import logging
 import traceback
 
 from google.appengine.ext import webapp
-from google.appengine.ext.webapp import template
 from django.utils import simplejson as json
 
 import context
 import errors
+import admission
+import blobs
 import _handlers
 
 class Endpoint(object):
@@ -22,6 +24,30 @@ class Endpoint(object):
     # implementors must set this to the root url of the endpoint
     root_url = None
 
+    # maximum number of requests this endpoint handles concurrently (None for unlimited).
+    # requests beyond this limit are rejected with 503.
+    max_concurrent_requests = None
+
+    # per-caller token bucket rate limit as a (requests per second, burst size) tuple (None for unlimited).
+    # callers are identified by rate_limit_key and requests beyond this limit are rejected with 429.
+    rate_limit = None
+
+    # where the limiter state is kept (e.g. admission.MemcacheLimiterStore()).
+    # None keeps the state in the memory of the instance.
+    limiter_store = None
+
+    # value of the 'Retry-After' header for requests rejected because the endpoint is saturated
+    saturated_retry_after = 1
+
+    # the blob store used by ctx.send_blob and by direct uploads (see the 'blobs' module).
+    # None uses the App Engine blobstore.
+    blob_store = None
+
+    # if True, uploads are streamed by the /__upload URL directly into the blob store instead
+    # of going through the App Engine upload service. Supports multipart form posts with multiple
+    # files and resumable uploads (see UploadRequestHandler).
+    direct_uploads = False
+
     def query(self, ctx):
         """Handler for GET requests. This handler should perform a query using any
         query parameters in the context
@@ -60,9 +86,11 @@ class Endpoint(object):
         In order to allow a client to upload a blob to this endpoint, call the ctx.upload_url() method
         to retrieve an upload URL. This URL should be used by the client to send an HTTP POST FORM.
         This method will be called by the App Engine blob upload service once the blob has been stored
-        in the blobstore.
+        in the blobstore (or, if direct_uploads is set, once the blobs were streamed into the blob store).
         Args:
-            ctx - The request context. Use ctx.
+            ctx - The request context. Use ctx.get_uploads() to retrieve the uploaded blobs.
+        Returns:
+            The resource path to redirect the client to.
         """
         raise NotImplementedError()
     
@@ -75,6 +103,28 @@ class Endpoint(object):
         """
         return None
 
+    def warmup(self):
+        """Called when an instance is warmed up (a request to /_ah/warmup), before it serves
+        any traffic. By default, compiles the html templates of the endpoint.
+        """
+        from google.appengine.ext.webapp import template
+        directory = os.path.dirname(inspect.getfile(self.__class__))
+        for file_name in os.listdir(directory):
+            if file_name.endswith('.html'):
+                template.load(os.path.join(directory, file_name))
+
+    def rate_limit_key(self, ctx):
+        """Returns the key that identifies the caller for rate limiting. Called after
+        authenticate_request. By default, uses the 'id' of the authentication context
+        (e.g. the facebook user) and the remote address for anonymous requests.
+        Args:
+            ctx - The request context
+        """
+        auth_ctx = ctx.auth_context
+        if isinstance(auth_ctx, dict) and auth_ctx.get('id'):
+            return 'user:%s' % auth_ctx['id']
+        return 'addr:%s' % ctx.request.remote_addr
+
     def alt_json(self, ctx, obj):
         """Emits a JSON representation of the response dictionary into the response object
         Args:
@@ -150,6 +200,7 @@ class Endpoint(object):
             ctx.response.set_status(404)
             ctx.response.out.write('unable to find file: %s' % path)
             return
+        from google.appengine.ext.webapp import template # loaded on first use, it is expensive
         ctx.response.out.write(template.render(path, template_dict))
     
     def _alt_html(self, ctx, obj, filename_prefix = ''):
@@ -212,18 +263,44 @@ class Endpoint(object):
                 super(SpecificUploadRequestHandler, self).__init__(cls)
         return SpecificUploadRequestHandler
 
+    @classmethod
+    def warmup_request_handler_class(cls):
+        """Returns a warmup request handler class for this endpoint"""
+        class SpecificWarmupRequestHandler(_handlers.WarmupRequestHandler):
+            def __init__(self):
+                super(SpecificWarmupRequestHandler, self).__init__(cls)
+        return SpecificWarmupRequestHandler
+
 from google.appengine.ext.webapp.util import run_wsgi_app
-def run_wsgi_restapp(endpoint_class):
-    """Creates a WSGIApplication for a REST endpoint and runs it.
+
+# WSGI applications by endpoint class. built once per instance and reused by all requests.
+_applications = {}
+
+def wsgi_restapp(endpoint_class):
+    """Returns the WSGIApplication of a REST endpoint. The application is created
+    on first use (or when the instance is warmed up) and reused afterwards.
     Args:
         endpoint_class - a class derived from Endpoint that implements the endpoint
     """
-    
+    application = _applications.get(endpoint_class)
+    if application:
+        return application
+
     root_url = endpoint_class.get_root_url()
     logging.info("starting a rest endpoint on '%s' with handler: %s" % (root_url, endpoint_class))
     
-    map = [('.*/__upload', endpoint_class.upload_request_handler_class()),
+    map = [('/_ah/warmup', endpoint_class.warmup_request_handler_class()),
+           ('.*/__upload(?:/.*)?', endpoint_class.upload_request_handler_class()),
            ('.*', endpoint_class.request_handler_class())]
 
     application = webapp.WSGIApplication(map, debug=True)
-    run_wsgi_app(application)
+    _applications[endpoint_class] = application
+    return application
+
+def run_wsgi_restapp(endpoint_class):
+    """Runs the WSGIApplication of a REST endpoint (see wsgi_restapp).
+    To warm up instances, enable the 'warmup' inbound service and route /_ah/warmup to the endpoint's script.
+    Args:
+        endpoint_class - a class derived from Endpoint that implements the endpoint
+    """
+    run_wsgi_app(wsgi_restapp(endpoint_class))
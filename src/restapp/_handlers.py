@@ -1,11 +1,15 @@
 """Request handlers for the restapp framework"""
 
-from google.appengine.ext.webapp import blobstore_handlers
 from google.appengine.ext import webapp
 
 import errors
+import admission
+import multipart
+import utils
 import logging
 import traceback
+import cgi
+import StringIO
 import context
 
 class RequestHandlerBase(webapp.RequestHandler):
@@ -17,13 +21,17 @@ class RequestHandlerBase(webapp.RequestHandler):
     
     def with_error_handling(self, code):
         """Runs 'code(ctx)' with request error handling.
+        Admission control (see the 'admission' module) is applied before 'code' is called.
         Args:
             code - The method to run
         """
+        slot = None
         try:
             ctx = self._create_context()
+            slot = admission.enter(self.endpoint, ctx)
             auth_ctx = self.endpoint.authenticate_request(ctx)
             ctx.auth_context = auth_ctx
+            admission.check_rate(self.endpoint, ctx)
             code(ctx)
         except errors.RequestError, e:
             logging.info('HTTP response (%d): %s' % (e.code, e.body))
@@ -31,9 +39,15 @@ class RequestHandlerBase(webapp.RequestHandler):
                 logging.error(traceback.format_exc())
             
             self.response.clear()
-            ctx.no_cache() # don't cache these results!
-            self.error(e.code)
+            if e.no_cache: ctx.no_cache() # don't cache these results!
+            if e.status_message: self.response.set_status(e.code, e.status_message)
+            else: self.error(e.code)
+            if e.retry_after is not None:
+                self.response.headers['Retry-After'] = str(e.retry_after)
             self.response.out.write(e.body)
+        finally:
+            if slot is not None:
+                admission.leave(self.endpoint, slot)
     
     def _create_context(self):
         query_start = self.request.url.find('?')
@@ -47,41 +61,221 @@ class RequestHandlerBase(webapp.RequestHandler):
                                       root_path_position = self.root_path_position,
                                       root_path = self.root_path)
 
-        # alias the 'send_blob' and 'get_uploads' methods into the context.
-                
-        if hasattr(self, 'send_blob'):
-            ctx.send_blob = self.send_blob
-            
+        # alias the 'get_uploads' method into the context.
         if hasattr(self, 'get_uploads'):
-            def get_uploads(field_name):
-                logging.error('here:%s' % field_name)
-                return self.get_uploads(field_name)
-            ctx.get_uploads = get_uploads
+            ctx.get_uploads = self.get_uploads
         
         return ctx
 
-class UploadRequestHandler(RequestHandlerBase, blobstore_handlers.BlobstoreUploadHandler):
+class RequestBody(object):
+    """A request body that was detached from the request so it can be streamed"""
+    
+    # number of bytes read from the request at a time
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, stream, length, content_type):
+        self.stream = stream
+        self.length = length
+        self.content_type = content_type
+
+    def chunks(self):
+        """Returns an iterator over the body"""
+        remaining = self.length
+        while remaining > 0:
+            data = self.stream.read(min(self.CHUNK_SIZE, remaining))
+            if not data:
+                raise errors.BadRequestError('request body is truncated')
+            remaining -= len(data)
+            yield data
+
+class UploadRequestHandler(RequestHandlerBase):
+    """Handles the special __upload URL of an endpoint.
+    
+    By default, this URL is called by the App Engine upload service after the blobs were stored.
+    If the endpoint sets 'direct_uploads', this URL accepts uploads directly and streams them
+    into the endpoint's blob store:
+        POST __upload with a multipart form - stores all the files in the form.
+        POST __upload?resumable=1 - starts a resumable upload. The 'X-Upload-Content-Type' and 
+            'X-Upload-Filename' headers describe the blob. Responds with 201 and the upload URL
+            in the 'Location' header.
+        PUT <upload URL> with a 'Content-Range: bytes first-last/total' header - appends a chunk to a
+            resumable upload. Responds with 308 and a 'Range' header with the bytes stored so far until
+            all bytes were stored ('Content-Range: bytes */total' only queries the stored range).
+    Once the blobs are stored, the endpoint's 'upload' method is called (once per resumable upload. later
+    requests for a completed upload are redirected to the URL it returned). The request body has already
+    been consumed at this point, so arguments are taken from the form fields and the query string.
+    """
+    
     def __init__(self, endpoint_class):
         """Initializes the upload request handler.
         Args:
             endpoint_class - the endpoint implementation class
         """
         super(UploadRequestHandler, self).__init__(endpoint_class)
-        blobstore_handlers.BlobstoreUploadHandler.__init__(self)
+        self.uploads = None
             
+    def get_uploads(self, field_name = None):
+        """Returns the blobs (BlobInfo objects) posted by the App Engine upload service.
+        Same as BlobstoreUploadHandler.get_uploads, without loading the blobstore handlers up front.
+        Args:
+            field_name - The name of the form field (all uploads if None)
+        """
+        if self.uploads is None:
+            from google.appengine.ext import blobstore
+            self.uploads = {}
+            for key, value in self.request.params.items():
+                if isinstance(value, cgi.FieldStorage) and 'blob-key' in value.type_options:
+                    self.uploads.setdefault(key, []).append(blobstore.parse_blob_info(value))
+        
+        if field_name:
+            return list(self.uploads.get(field_name, []))
+        return [ blob for field_uploads in self.uploads.values() for blob in field_uploads ]
+
     def get(self):
         def safe_get(ctx):
             raise errors.BadRequestError('GET is not supported for this special __upload endpoint')
         self.with_error_handling(safe_get)
     
     def post(self):
+        if self.endpoint_class.direct_uploads:
+            self._direct_post()
+            return
+
         def safe_post(ctx):
             relative_url = self.endpoint.upload(ctx)
             self.redirect(self.endpoint_class.construct_relative_url(relative_url))
 
         self.with_error_handling(safe_post)
 
-class RequestHandler(RequestHandlerBase, blobstore_handlers.BlobstoreDownloadHandler):
+    def put(self):
+        if not self.endpoint_class.direct_uploads:
+            def safe_put(ctx):
+                raise errors.BadRequestError('PUT is only supported for endpoints with direct uploads')
+            self.with_error_handling(safe_put)
+            return
+
+        body = self._detach_body()
+        
+        def safe_put(ctx):
+            store = ctx.blob_store
+            upload_key = self.request.path.rstrip('/').rsplit('/', 1)[-1]
+            size = store.uploaded_size(upload_key)
+            if size is None:
+                raise errors.NotFoundError('upload %s not found' % upload_key)
+
+            content_range = self.request.headers.get('Content-Range')
+            if content_range:
+                content_range = utils.parse_content_range(content_range)
+                if not content_range:
+                    raise errors.BadRequestError('invalid Content-Range header')
+                first, last, total = content_range
+                if first is not None and last - first + 1 != body.length:
+                    raise errors.BadRequestError('Content-Range does not match the length of the body')
+            else:
+                first, total = 0, body.length # the body is the entire blob
+
+            # a chunk that does not continue the upload (or that races another request appending to it)
+            # is ignored and the client is told what we have
+            if first == size:
+                size = store.append(upload_key, first, body.chunks())
+                if size is None:
+                    raise errors.NotFoundError('upload %s not found' % upload_key)
+
+            # the endpoint's upload handler is called once per upload. repeated requests for a completed
+            # upload are redirected to the same URL.
+            if total is not None and size >= total:
+                location = store.complete(upload_key, lambda blob: self._call_upload(ctx, { 'file': [ blob ] }, {}))
+                if location is not None:
+                    self.redirect(location)
+                    return
+
+            # more bytes are expected (or another request is completing the upload, so the client should ask again)
+            self.response.set_status(308, 'Resume Incomplete')
+            if size: self.response.headers['Range'] = 'bytes=0-%d' % (size - 1)
+
+        self.with_error_handling(safe_put)
+
+    def _direct_post(self):
+        body = self._detach_body()
+
+        def safe_post(ctx):
+            store = ctx.blob_store
+            if ctx.argument('resumable'):
+                upload_key = store.create(self.request.headers.get('X-Upload-Content-Type'),
+                                          self.request.headers.get('X-Upload-Filename'))
+                location = self.endpoint_class.construct_absolute_url(ctx, '__upload/' + upload_key)
+                if self.request.query_string: location += '?' + self.request.query_string
+                self.response.set_status(201)
+                self.response.headers['Location'] = location
+                return
+
+            boundary = multipart.boundary(body.content_type)
+            if not boundary:
+                raise errors.BadRequestError('uploads must be posted as multipart/form-data')
+
+            # files are streamed into the store one after the other, as they appear in the body.
+            # if the body turns out to be truncated or malformed, the files stored so far are deleted.
+            uploads = {}
+            fields = {}
+            upload_keys = []
+            try:
+                for part in multipart.MultipartReader(body.chunks(), boundary).parts():
+                    if part.filename is None:
+                        fields[part.name] = part.read()
+                    elif part.filename:
+                        upload_keys.append(store.create(part.content_type, part.filename))
+                        store.append(upload_keys[-1], 0, part.chunks())
+                        uploads.setdefault(part.name, []).append(store.finalize(upload_keys[-1]))
+            except:
+                for upload_key in upload_keys:
+                    try:
+                        store.delete_upload(upload_key)
+                    except Exception:
+                        logging.error('unable to delete upload %s: %s' % (upload_key, traceback.format_exc()))
+                raise
+            
+            self.redirect(self._call_upload(ctx, uploads, fields))
+
+        self.with_error_handling(safe_post)
+
+    def _call_upload(self, ctx, uploads, fields):
+        """Calls the endpoint's upload handler with blobs that were uploaded directly
+        Returns:
+            The URL to redirect the client to
+        """
+        def get_uploads(field_name = None):
+            if field_name: return uploads.get(field_name, [])
+            return [ blob for field_uploads in uploads.values() for blob in field_uploads ]
+
+        ctx.get_uploads = get_uploads
+        ctx.upload_fields = fields
+        relative_url = self.endpoint.upload(ctx)
+        return self.endpoint_class.construct_relative_url(relative_url)
+
+    def _detach_body(self):
+        """Detaches the body from the request so that it can be streamed. Reading request
+        arguments (e.g. in authenticate_request) will no longer parse the body.
+        """
+        environ = self.request.environ
+        body = RequestBody(environ['wsgi.input'],
+                           int(environ.get('CONTENT_LENGTH') or 0),
+                           environ.get('CONTENT_TYPE', ''))
+        environ['wsgi.input'] = StringIO.StringIO()
+        environ['CONTENT_LENGTH'] = '0'
+        environ['CONTENT_TYPE'] = 'application/x-www-form-urlencoded'
+        return body
+
+class WarmupRequestHandler(webapp.RequestHandler):
+    """Handles warmup requests (/_ah/warmup) by calling the endpoint's 'warmup' method"""
+
+    def __init__(self, endpoint_class):
+        self.endpoint_class = endpoint_class
+
+    def get(self):
+        self.endpoint_class().warmup()
+        self.response.out.write('warm')
+
+class RequestHandler(RequestHandlerBase):
     """Handler that handles REST requests for a specified endpoint"""
     
     def __init__(self, endpoint_class, default_alt = 'html'):
@@ -94,7 +288,6 @@ class RequestHandler(RequestHandlerBase, blobstore_handlers.BlobstoreDownloadHan
                               is the 'user' and it's position is 1.
         """
         super(RequestHandler, self).__init__(endpoint_class)
-        blobstore_handlers.BlobstoreDownloadHandler.__init__(self)
         self.default_alt = default_alt
     
     def get(self):
@@ -0,0 +1,200 @@
+"""Admission control for restapp endpoints.
+
+Provides per-endpoint concurrency limits and per-caller token bucket rate limits.
+Both are checked by the request handler before a request reaches the endpoint's
+handler methods, so rejected requests are cheap (429/503 with 'Retry-After').
+"""
+
+import math
+import time
+import logging
+import threading
+
+import errors
+
+def _take_token(tokens, last, now, rate, burst):
+    """Refills a token bucket and tries to take a single token out of it.
+    Returns:
+        A (tokens, wait) tuple with the remaining tokens and the number of seconds
+        until a token is available (0 if a token was taken).
+    """
+    tokens = min(float(burst), tokens + (now - last) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0
+    return tokens, (1 - tokens) / rate
+
+class LocalLimiterStore(object):
+    """Keeps limiter state in the memory of the current instance.
+    This is the cheapest store, but limits are enforced per instance.
+    """
+
+    # maximum number of buckets kept. buckets are pruned at most once every PRUNE_INTERVAL_SEC,
+    # so a flood of new callers does not make every request pay for a scan of all buckets.
+    MAX_BUCKETS = 10000
+    PRUNE_INTERVAL_SEC = 10
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._buckets = {}
+        self._last_prune = 0
+
+    def acquire_slot(self, key, limit):
+        """Tries to acquire one of 'limit' concurrency slots.
+        Args:
+            key - The key of the slots (e.g. the endpoint root url)
+            limit - The maximum number of slots
+        Returns:
+            A slot (to be released with 'release_slot') or None if all slots are taken.
+        """
+        self._lock.acquire()
+        try:
+            in_flight = self._slots.get(key, 0)
+            if in_flight >= limit:
+                return None
+            self._slots[key] = in_flight + 1
+            return key
+        finally:
+            self._lock.release()
+
+    def release_slot(self, slot):
+        """Releases a slot acquired by 'acquire_slot'"""
+        self._lock.acquire()
+        try:
+            in_flight = self._slots.get(slot, 0) - 1
+            if in_flight > 0: self._slots[slot] = in_flight
+            else: self._slots.pop(slot, None)
+        finally:
+            self._lock.release()
+
+    def consume_token(self, key, rate, burst):
+        """Takes a token from a token bucket.
+        Args:
+            key - The key of the bucket (e.g. the endpoint and the caller)
+            rate - Number of tokens added to the bucket per second
+            burst - The size of the bucket
+        Returns:
+            0 if a token was taken, otherwise the number of seconds until one will be available.
+        """
+        now = time.time()
+        self._lock.acquire()
+        try:
+            if len(self._buckets) > self.MAX_BUCKETS and now - self._last_prune >= self.PRUNE_INTERVAL_SEC:
+                self._prune(now)
+            tokens, last = self._buckets.get(key, (burst, now))[:2]
+            tokens, wait = _take_token(tokens, last, now, rate, burst)
+            self._buckets[key] = (tokens, now, rate, burst)
+            return wait
+        finally:
+            self._lock.release()
+
+    def _prune(self, now):
+        """Drops buckets that are full again (dropping them does not change behavior).
+        If there are still too many buckets, the least recently used ones are dropped.
+        """
+        self._last_prune = now
+        for key, (tokens, last, rate, burst) in self._buckets.items():
+            if tokens + (now - last) * rate >= burst:
+                del self._buckets[key]
+
+        excess = len(self._buckets) - self.MAX_BUCKETS
+        if excess > 0:
+            lru = sorted(self._buckets.items(), key = lambda item: item[1][1])
+            for key, bucket in lru[:excess]:
+                del self._buckets[key]
+
+class MemcacheLimiterStore(object):
+    """Keeps limiter state in memcache, so limits are shared by all instances.
+    If memcache is unavailable or evicts the state, requests are admitted.
+    """
+
+    # number of compare-and-set attempts before giving up (and admitting the request)
+    CAS_RETRIES = 3
+
+    # slots are counted per time window (at least the request deadline), and a request is counted in the
+    # window in which it started. counters expire after two windows, so slots of requests that never
+    # released them (e.g. hit the deadline) are reclaimed.
+    SLOT_WINDOW_SEC = 60
+
+    def __init__(self, namespace = 'restapp.admission'):
+        from google.appengine.api import memcache
+        self.namespace = namespace
+        self.cache = memcache.Client()
+
+    def acquire_slot(self, key, limit):
+        """See LocalLimiterStore.acquire_slot"""
+        window = int(time.time()) / self.SLOT_WINDOW_SEC
+        slot = 'slots:%s:%d' % (key, window)
+        self.cache.add(slot, 0, time = 2 * self.SLOT_WINDOW_SEC, namespace = self.namespace)
+        in_flight = self.cache.incr(slot, namespace = self.namespace)
+        if in_flight is None:
+            return slot
+
+        # requests that started in the previous window may still be running
+        in_flight += self.cache.get('slots:%s:%d' % (key, window - 1), namespace = self.namespace) or 0
+        if in_flight > limit:
+            self.release_slot(slot)
+            return None
+        return slot
+
+    def release_slot(self, slot):
+        """See LocalLimiterStore.release_slot"""
+        self.cache.decr(slot, namespace = self.namespace)
+
+    def consume_token(self, key, rate, burst):
+        """See LocalLimiterStore.consume_token"""
+        cache_key = 'bucket:' + key
+        ttl = int(math.ceil(burst / float(rate))) + 1 # an evicted bucket is a full bucket
+
+        for i in range(self.CAS_RETRIES):
+            now = time.time()
+            state = self.cache.gets(cache_key, namespace = self.namespace)
+            if state is None:
+                tokens, wait = _take_token(burst, now, now, rate, burst)
+                if self.cache.add(cache_key, (tokens, now), time = ttl, namespace = self.namespace):
+                    return wait
+            else:
+                tokens, wait = _take_token(state[0], state[1], now, rate, burst)
+                if self.cache.cas(cache_key, (tokens, now), time = ttl, namespace = self.namespace):
+                    return wait
+
+        logging.warning('unable to update rate limit bucket %s, admitting request' % key)
+        return 0
+
+# limiter store used by endpoints that do not define their own 'limiter_store'
+default_store = LocalLimiterStore()
+
+def _store(endpoint):
+    return endpoint.limiter_store or default_store
+
+def enter(endpoint, ctx):
+    """Acquires a concurrency slot for the endpoint of the request.
+    Raises ServiceUnavailableError if the endpoint is saturated.
+    Returns:
+        The acquired slot (None if the endpoint has no concurrency limit). It must be released
+        using 'leave' when the request is done.
+    """
+    limit = endpoint.max_concurrent_requests
+    if not limit:
+        return None
+    slot = _store(endpoint).acquire_slot(ctx.root_path, limit)
+    if slot is None:
+        raise errors.ServiceUnavailableError('too many concurrent requests',
+                                             retry_after = endpoint.saturated_retry_after)
+    return slot
+
+def leave(endpoint, slot):
+    """Releases the concurrency slot acquired by 'enter'"""
+    _store(endpoint).release_slot(slot)
+
+def check_rate(endpoint, ctx):
+    """Takes a token from the bucket of the caller (identified by endpoint.rate_limit_key).
+    Raises TooManyRequestsError if the caller exceeded the rate limit of the endpoint.
+    """
+    if not endpoint.rate_limit:
+        return
+    rate, burst = endpoint.rate_limit
+    key = '%s:%s' % (ctx.root_path, endpoint.rate_limit_key(ctx))
+    wait = _store(endpoint).consume_token(key, rate, burst)
+    if wait:
+        raise errors.TooManyRequestsError('rate limit exceeded', retry_after = int(math.ceil(wait)))
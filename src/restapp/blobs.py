@@ -0,0 +1,358 @@
+"""Blob stores for the restapp framework.
+
+A blob store is used by RequestContext.send_blob to serve blobs. Endpoints select
+a store by setting their 'blob_store' attribute (the App Engine blobstore by default).
+A store implements:
+    stat(key) - returns a BlobStat for the blob or None if it does not exist
+    open(key) - returns a seekable file-like object with the contents of the blob
+    serve(response, key, byte_range) - optional. sends the blob (or the (first, last) byte range)
+        without reading it into the instance. send_blob streams the bytes from 'open' otherwise.
+
+Stores that accept direct uploads (see Endpoint.direct_uploads) also implement:
+    create(content_type, filename) - starts a new upload and returns its key
+    append(upload_key, offset, chunks) - appends an iterator of chunks to the upload if its size is 'offset'
+        and no other request is appending to it. returns the size of the upload (None if there is no such upload)
+    uploaded_size(upload_key) - returns the size of an upload or None if there is no such upload
+        (only keys returned by 'create' are uploads)
+    finalize(upload_key) - completes an upload and returns a BlobStat for the new blob (may be called again)
+    complete(upload_key, handler) - finalizes an upload and calls handler(blob) with its BlobStat once per upload.
+        the string returned by the handler (e.g. the URL the client was redirected to) is kept and returned by this
+        and every later call. returns None if another request is completing the upload. if the handler fails,
+        the upload may be completed again.
+    delete_upload(upload_key) - deletes an upload and its blob (whether it was finalized or not)
+"""
+
+import os
+import re
+import threading
+import mimetypes
+from datetime import datetime
+from datetime import timedelta
+
+class BlobStat(object):
+    """Describes a stored blob"""
+    def __init__(self, key, size, content_type = None, filename = None, creation = None):
+        """Constructor.
+        Args:
+            key - The blob key
+            size - The size of the blob in bytes
+            content_type - The content type of the blob
+            filename - The original file name of the blob
+            creation - The time the blob was created (a datetime in UTC)
+        """
+        self.key = key
+        self.size = size
+        self.content_type = content_type
+        self.filename = filename
+        self.creation = creation
+
+class BlobstoreBlobStore(object):
+    """Keeps blobs in the App Engine blobstore.
+    Blobs are sent by the App Engine serving infrastructure and are never read by the instance.
+    Uploads are written using the files API and their state is kept in the datastore.
+    """
+
+    FILES_PREFIX = '/blobstore/'
+
+    # an append or completion that did not finish within this time (e.g. the instance died) no longer blocks the upload
+    CLAIM_TIMEOUT_SEC = 10 * 60
+
+    def stat(self, key):
+        from google.appengine.ext import blobstore
+        info = blobstore.BlobInfo.get(key)
+        if not info:
+            return None
+        return BlobStat(str(info.key()), info.size, info.content_type, info.filename, info.creation)
+
+    def open(self, key):
+        from google.appengine.ext import blobstore
+        return blobstore.BlobReader(key)
+
+    def serve(self, response, key, byte_range):
+        from google.appengine.ext import blobstore
+        response.headers[blobstore.BLOB_KEY_HEADER] = key
+        if byte_range:
+            response.headers[blobstore.BLOB_RANGE_HEADER] = 'bytes=%d-%d' % byte_range
+
+    def create(self, content_type = None, filename = None):
+        from google.appengine.api import files
+        name = files.blobstore.create(mime_type = content_type or 'application/octet-stream',
+                                      _blobinfo_uploaded_filename = filename)
+        upload_key = name[len(self.FILES_PREFIX):]
+        _blob_upload_model()(key_name = upload_key).put()
+        return upload_key
+
+    def append(self, upload_key, offset, chunks):
+        from google.appengine.ext import db
+        from google.appengine.api import files
+        model = _blob_upload_model()
+
+        def claim():
+            upload = model.get_by_key_name(upload_key)
+            if not upload:
+                return None, False
+            now = datetime.utcnow()
+            if upload.size != offset or upload.blob_key or (upload.appending_until and upload.appending_until > now):
+                return upload.size, False
+            upload.appending_until = now + timedelta(seconds = self.CLAIM_TIMEOUT_SEC)
+            upload.put()
+            return upload.size, True
+
+        def release(written):
+            upload = model.get_by_key_name(upload_key)
+            upload.size += written
+            upload.appending_until = None
+            upload.put()
+            return upload.size
+
+        size, claimed = db.run_in_transaction(claim)
+        if not claimed:
+            return size
+
+        # the offset is updated with the bytes actually written, even if the request fails midway
+        written = 0
+        try:
+            f = files.open(self.FILES_PREFIX + upload_key, 'a')
+            try:
+                for chunk in chunks:
+                    f.write(chunk)
+                    written += len(chunk)
+            finally:
+                f.close()
+        finally:
+            size = db.run_in_transaction(release, written)
+        return size
+
+    def uploaded_size(self, upload_key):
+        upload = _blob_upload_model().get_by_key_name(upload_key)
+        if not upload:
+            return None
+        return upload.size
+
+    def finalize(self, upload_key):
+        from google.appengine.api import files
+        upload = _blob_upload_model().get_by_key_name(upload_key)
+        if not upload.blob_key:
+            name = self.FILES_PREFIX + upload_key
+            try:
+                files.finalize(name)
+            except files.FinalizationError:
+                pass # finalized by a concurrent request
+            upload.blob_key = str(files.blobstore.get_blob_key(name))
+            upload.put()
+        return self.stat(upload.blob_key)
+
+    def complete(self, upload_key, handler):
+        from google.appengine.ext import db
+        model = _blob_upload_model()
+
+        def claim():
+            upload = model.get_by_key_name(upload_key)
+            if not upload:
+                return None, False
+            now = datetime.utcnow()
+            if upload.result is not None or (upload.completing_until and upload.completing_until > now):
+                return upload.result, False
+            upload.completing_until = now + timedelta(seconds = self.CLAIM_TIMEOUT_SEC)
+            upload.put()
+            return None, True
+
+        def release(result):
+            upload = model.get_by_key_name(upload_key)
+            upload.result = result
+            upload.completing_until = None
+            upload.put()
+
+        result, claimed = db.run_in_transaction(claim)
+        if not claimed:
+            return result
+
+        result = None
+        try:
+            result = handler(self.finalize(upload_key))
+        finally:
+            db.run_in_transaction(release, result)
+        return result
+
+    def delete_upload(self, upload_key):
+        from google.appengine.ext import blobstore
+        upload = _blob_upload_model().get_by_key_name(upload_key)
+        if not upload:
+            return
+        # the files API cannot delete a writable file, so it is finalized first
+        blob = self.finalize(upload_key)
+        if blob: blobstore.delete(blob.key)
+        upload.delete()
+
+_blob_upload_class = None
+
+def _blob_upload_model():
+    """Returns the model that keeps the state of uploads into the blobstore.
+    Defined on first use, so the datastore API is not loaded by endpoints without uploads.
+    """
+    global _blob_upload_class
+    if _blob_upload_class is None:
+        from google.appengine.ext import db
+        class RestappBlobUpload(db.Model):
+            """An upload into the blobstore. The key name is the upload key."""
+            size = db.IntegerProperty(default = 0)
+            appending_until = db.DateTimeProperty()
+            blob_key = db.StringProperty()
+            completing_until = db.DateTimeProperty()
+            result = db.TextProperty()
+        _blob_upload_class = RestappBlobUpload
+    return _blob_upload_class
+
+class FileSystemBlobStore(object):
+    """Keeps blobs as files in a local directory (a stand-in for the blobstore,
+    e.g. for development and benchmarks). The blob key is the file name.
+    Uploads are written to '<key>.part' files. The content type, file name and completion
+    result of uploads are kept in '<key>.meta' files, which also mark keys as uploads.
+    """
+
+    # blob keys are file names, so they may not contain path separators
+    KEY_PATTERN = re.compile(r'^[A-Za-z0-9_\-\.]+$')
+    PART_SUFFIX = '.part'
+    META_SUFFIX = '.meta'
+
+    def __init__(self, root):
+        """Constructor.
+        Args:
+            root - The directory in which blobs are stored
+        """
+        self.root = root
+        self._lock = threading.Lock()
+        self._appending = set()
+        self._completing = set()
+
+    def path(self, key):
+        """Returns the path of the file of a blob or None if the key is invalid"""
+        key = str(key)
+        if not self.KEY_PATTERN.match(key) or key.startswith('.'):
+            return None
+        if key.endswith(self.PART_SUFFIX) or key.endswith(self.META_SUFFIX):
+            return None
+        return os.path.join(self.root, key)
+
+    def stat(self, key):
+        path = self.path(key)
+        if not path or not os.path.isfile(path):
+            return None
+        st = os.stat(path)
+        content_type, filename, result = self._read_meta(path)
+        if not content_type: content_type = mimetypes.guess_type(path)[0]
+        return BlobStat(str(key), st.st_size, content_type, filename or str(key),
+                        datetime.utcfromtimestamp(st.st_mtime))
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+    def create(self, content_type = None, filename = None):
+        import uuid # loads ctypes on import, so it is deferred until the first upload
+        upload_key = uuid.uuid4().hex
+        path = self.path(upload_key)
+        open(path + self.PART_SUFFIX, 'wb').close()
+        self._write_meta(path, (content_type, filename, None))
+        return upload_key
+
+    def append(self, upload_key, offset, chunks):
+        self._lock.acquire()
+        try:
+            size = self.uploaded_size(upload_key)
+            if size != offset or upload_key in self._appending or not os.path.isfile(self.path(upload_key) + self.PART_SUFFIX):
+                return size
+            self._appending.add(upload_key)
+        finally:
+            self._lock.release()
+
+        part_path = self.path(upload_key) + self.PART_SUFFIX
+        try:
+            f = open(part_path, 'ab')
+            try:
+                for chunk in chunks:
+                    f.write(chunk)
+            finally:
+                f.close()
+            return os.path.getsize(part_path)
+        finally:
+            self._lock.acquire()
+            try:
+                self._appending.discard(upload_key)
+            finally:
+                self._lock.release()
+
+    def uploaded_size(self, upload_key):
+        path = self.path(upload_key)
+        if not path or not os.path.isfile(path + self.META_SUFFIX):
+            return None
+        for upload_path in (path + self.PART_SUFFIX, path):
+            if os.path.isfile(upload_path):
+                return os.path.getsize(upload_path)
+        return None
+
+    def finalize(self, upload_key):
+        path = self.path(upload_key)
+        self._lock.acquire()
+        try:
+            if not path or not os.path.isfile(path + self.META_SUFFIX):
+                return None
+            if os.path.isfile(path + self.PART_SUFFIX):
+                os.rename(path + self.PART_SUFFIX, path)
+        finally:
+            self._lock.release()
+        return self.stat(upload_key)
+
+    def complete(self, upload_key, handler):
+        if self.uploaded_size(upload_key) is None:
+            return None
+        path = self.path(upload_key)
+        self._lock.acquire()
+        try:
+            meta = self._read_meta(path)
+            if meta[2] is not None or upload_key in self._completing:
+                return meta[2]
+            self._completing.add(upload_key)
+        finally:
+            self._lock.release()
+
+        try:
+            result = handler(self.finalize(upload_key))
+            self._write_meta(path, meta[:2] + (result,))
+            return result
+        finally:
+            self._lock.acquire()
+            try:
+                self._completing.discard(upload_key)
+            finally:
+                self._lock.release()
+
+    def delete_upload(self, upload_key):
+        path = self.path(upload_key)
+        for upload_path in (path + self.PART_SUFFIX, path + self.META_SUFFIX, path):
+            if os.path.isfile(upload_path):
+                os.remove(upload_path)
+
+    def _read_meta(self, path):
+        """Returns the (content_type, filename, result) of an upload (all None if the path is not an upload)"""
+        if not path or not os.path.isfile(path + self.META_SUFFIX):
+            return None, None, None
+        meta = open(path + self.META_SUFFIX, 'r')
+        try:
+            lines = [line.rstrip('\n').decode('utf-8', 'replace') or None for line in meta.readlines()]
+        finally:
+            meta.close()
+        return tuple((lines + [None, None, None])[:3])
+
+    def _write_meta(self, path, values):
+        """Writes the (content_type, filename, result) of an upload"""
+        meta = open(path + self.META_SUFFIX, 'w')
+        try:
+            for value in values:
+                value = value or ''
+                if isinstance(value, unicode): value = value.encode('utf-8')
+                meta.write(value.replace('\n', ' ') + '\n')
+        finally:
+            meta.close()
+
+# blob store used by endpoints that do not define their own 'blob_store'
+default_store = BlobstoreBlobStore()
@@ -1,13 +1,17 @@
 """Request and response context objects for the respapp framework"""
 
 import inspect
+import calendar
 import errors
 import logging
 
 from datetime import timedelta
 from datetime import datetime
 import utils
-from google.appengine.api import blobstore
+import blobs
+
+# number of bytes read from the blob store at a time by send_blob
+SEND_BLOB_CHUNK_SIZE = 512 * 1024
 
 class RequestContext(object):
     """Represents a request context"""
@@ -29,6 +33,7 @@ class RequestContext(object):
         self.resource_path = self._get_resource_path()
         self.auth_context = None
         self.endpoint_class = endpoint_class
+        self.upload_fields = None
 
     def require(self, key, msgfmt = "missing required argument '%s'"):
         """Tries to retrieve an argument from the request and if
@@ -37,7 +42,7 @@ class RequestContext(object):
             key - The GET/POST parameter name
             message - The message to emit with the error
         """
-        val = self.request.get(key)
+        val = self._get(key)
         if not val or val == '':
             raise errors.BadRequestError(msgfmt % key);
         return val
@@ -48,7 +53,7 @@ class RequestContext(object):
             key - the key name
             default_value - the value to return if not defined
         """
-        val = self.request.get(key)
+        val = self._get(key)
         if not val or val == '': return default_value
         return val 
     
@@ -99,26 +104,136 @@ class RequestContext(object):
         """Creates a blob upload URL for this endpoint.
         For all endpoints, we assume that we have an /__upload URL that is bound
         to an blob upload endpoint. This makes implementing upload for an endpoint very easy.
+        If the endpoint accepts direct uploads, this is the /__upload URL itself.
         Args:
             query: query parameters to add (in URL format)
         """
-        post_url = self.endpoint_class.construct_relative_url('__upload' + query)
+        post_url = self.endpoint_class.construct_relative_url('__upload' + (query or ''))
         logging.info('constructed upload url: %s' % post_url)
+        if self.endpoint_class.direct_uploads:
+            return self.request.scheme + '://' + self.request.host + post_url
+        from google.appengine.api import blobstore
         url = blobstore.create_upload_url(post_url)
         logging.info('url: %s' % url)
         return url
 
-    def get_uploads(self, *args):
+    def get_uploads(self, field_name = None):
         """Should be called by the 'upload' handler to retrieve the uploads just
-        stored in the blobstore.
+        stored in the blobstore (BlobInfo objects) or, for direct uploads, in the
+        endpoint's blob store (BlobStat objects).
+        Args:
+            field_name - The name of the form field (all uploads if None)
         """
         raise errors.InternalServerError("'get_uploads' can only be called from the 'upload' handler")
     
-    def send_blob(self, *args):
-        """May be called to send a blob into the response object.
-        Same signature as the App Engine send_blob method.
+    def send_blob(self, blob_key, content_type = None, save_as = None, immutable = True):
+        """Sends a blob from the endpoint's blob store into the response object.
+        Supports range requests ('Range' and 'If-Range') and conditional requests ('If-None-Match')
+        using an ETag derived from the blob key (and, unless the blob is immutable, its size and creation time).
+        Args:
+            blob_key - The key of the blob (or a BlobInfo or BlobStat object, e.g. from ctx.get_uploads())
+            content_type - Overrides the content type of the blob
+            save_as - A file name to send the blob as an attachment. True uses the blob's file name.
+            immutable - Blobs are never modified, so by default they may be cached forever.
+                        Set to False if the blob store reuses keys.
+        """
+        if isinstance(blob_key, blobs.BlobStat): blob_key = blob_key.key
+        elif hasattr(blob_key, 'key'): blob_key = blob_key.key()
+        blob_key = str(blob_key)
+        
+        stat = self.blob_store.stat(blob_key)
+        if not stat:
+            raise errors.NotFoundError('blob %s not found' % blob_key)
+
+        etag = self._blob_etag(stat, immutable)
+        self.response.headers['ETag'] = etag
+        self.response.headers['Accept-Ranges'] = 'bytes'
+        if stat.creation:
+            self.response.headers['Last-Modified'] = utils.format_http_time(stat.creation)
+        if immutable:
+            self.cache_never_expires()
+        
+        if_none_match = self.request.headers.get('If-None-Match')
+        if if_none_match and (if_none_match.strip() == '*' or etag in [t.strip() for t in if_none_match.split(',')]):
+            raise errors.NotModifiedError()
+
+        # determine which bytes to send
+        first, last = 0, stat.size - 1
+        partial = False
+        range_header = self.request.headers.get('Range')
+        if range_header and self._if_range_matches(etag, stat.creation):
+            byte_range = utils.parse_byte_range(range_header, stat.size)
+            if byte_range:
+                first, last = byte_range
+                if first > last:
+                    self.response.headers['Content-Range'] = 'bytes */%d' % stat.size
+                    raise errors.RangeNotSatisfiableError('%s (size is %d)' % (range_header, stat.size))
+                partial = True
+                self.response.set_status(206)
+                self.response.headers['Content-Range'] = 'bytes %d-%d/%d' % (first, last, stat.size)
+
+        self.response.headers['Content-Type'] = content_type or stat.content_type or 'application/octet-stream'
+        if save_as:
+            if save_as is True: save_as = stat.filename or blob_key
+            self.response.headers['Content-Disposition'] = utils.format_attachment(save_as)
+
+        # stores that can have the bytes sent by the serving infrastructure do not stream them through the app
+        if hasattr(self.blob_store, 'serve'):
+            self.blob_store.serve(self.response, blob_key, partial and (first, last) or None)
+            return
+        
+        blob = self.blob_store.open(blob_key)
+        try:
+            blob.seek(first)
+            remaining = last - first + 1
+            while remaining > 0:
+                data = blob.read(min(remaining, SEND_BLOB_CHUNK_SIZE))
+                if not data: break
+                self.response.out.write(data)
+                remaining -= len(data)
+        finally:
+            blob.close()
+
+    @property
+    def blob_store(self):
+        """The blob store of the endpoint (see the 'blobs' module)"""
+        return self.endpoint_class.blob_store or blobs.default_store
+
+    def _get(self, key):
+        """Retrieves a request argument. For direct uploads, the request body has already been
+        consumed, so arguments are taken from the upload form fields and the query string.
+        """
+        if self.upload_fields and key in self.upload_fields:
+            return self.upload_fields[key]
+        return self.request.get(key)
+
+    def _blob_etag(self, stat, immutable):
+        """Returns the ETag of a blob. Blobs in stores that reuse keys may be replaced, so their
+        ETag also changes with the size and creation time of the blob.
+        """
+        if immutable:
+            return '"%s"' % stat.key
+        created = 0
+        if stat.creation:
+            created = calendar.timegm(stat.creation.utctimetuple()) * 1000000 + stat.creation.microsecond
+        return '"%s-%d-%x"' % (stat.key, stat.size, created)
+
+    def _if_range_matches(self, etag, last_modified):
+        """Checks the 'If-Range' header of the request (if any). The range should only be sent
+        if the validator in this header matches the blob.
         """
-        raise NotImplementedError("send_blob cannot be called from the 'upload' handler")
+        if_range = self.request.headers.get('If-Range')
+        if not if_range:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith('"') or if_range.startswith('W/'):
+            return if_range == etag
+        if not last_modified:
+            return False
+        try:
+            return utils.parse_http_time(if_range) >= last_modified.replace(microsecond = 0)
+        except ValueError:
+            return False
 
     def _get_resource_path(self):
         """Splits the request path and returns the path after the endpoint root
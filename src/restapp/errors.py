@@ -4,6 +4,15 @@ class RequestError(Exception):
         code - http error code
         body - message to be emitted
     """
+    # seconds the client should wait before retrying (emitted as 'Retry-After')
+    retry_after = None
+
+    # reason phrase for status codes that are unknown to webapp (e.g. 429)
+    status_message = None
+
+    # error responses are not cached. responses that refresh the client's cached copy (304) opt out.
+    no_cache = True
+
     def __init__(self, code = 500, body = 'Internal server error'):
         self.code = code
         self.body = body
@@ -13,6 +22,8 @@ class InternalServerError(RequestError):
         super(self.__class__, self).__init__(500, "Internal server error: %s" % body)
 
 class NotModifiedError(RequestError):
+    no_cache = False
+
     def __init__(self, body = "Bad request"):
         super(self.__class__, self).__init__(304, "Not modified")
 
@@ -24,6 +35,22 @@ class NotFoundError(RequestError):
     def __init__(self, body = "Not found"):
         super(self.__class__, self).__init__(404, "Bad request: %s" % body)
 
+class RangeNotSatisfiableError(RequestError):
+    def __init__(self, body = "Range not satisfiable"):
+        super(self.__class__, self).__init__(416, "Range not satisfiable: %s" % body)
+
 class UnauthorizedRequestError(RequestError):
     def __init__(self, body = "Unauthorized"):
         super(self.__class__, self).__init__(401, "Unauthorized: %s" % body)
+
+class TooManyRequestsError(RequestError):
+    status_message = "Too Many Requests"
+
+    def __init__(self, body = "Too many requests", retry_after = None):
+        super(self.__class__, self).__init__(429, "Too many requests: %s" % body)
+        self.retry_after = retry_after
+
+class ServiceUnavailableError(RequestError):
+    def __init__(self, body = "Service unavailable", retry_after = None):
+        super(self.__class__, self).__init__(503, "Service unavailable: %s" % body)
+        self.retry_after = retry_after
@@ -0,0 +1,168 @@
+"""A streaming multipart/form-data parser for the restapp framework.
+
+Parts are parsed from an iterator of chunks (e.g. the request body) and the content
+of each part is also returned as chunks, so file contents are never buffered in memory.
+"""
+
+import re
+import errors
+
+# maximum size of the headers of a single part
+MAX_HEADERS_SIZE = 16 * 1024
+
+# maximum size of a form field that is read into memory (see Part.read)
+MAX_FIELD_SIZE = 1024 * 1024
+
+_OPTION_RE = re.compile(r';\s*([^\s=;]+)\s*=\s*("(?:[^"\\]|\\.)*"|[^;]*)')
+
+def parse_options(value):
+    """Parses a header value with options (e.g. 'form-data; name="file"; filename="a.jpg"').
+    Returns:
+        A (value, options) tuple. The value is lower case and options is a dictionary.
+    """
+    value = value or ''
+    end = value.find(';')
+    if end == -1: end = len(value)
+    options = {}
+    for name, option in _OPTION_RE.findall(value[end:]):
+        option = option.strip()
+        if len(option) >= 2 and option[0] == option[-1] == '"':
+            option = option[1:-1].replace('\\"', '"')
+        options[name.lower()] = option
+    return value[:end].strip().lower(), options
+
+def boundary(content_type):
+    """Returns the boundary of a multipart/form-data content type or None if this is not a multipart body"""
+    value, options = parse_options(content_type)
+    if value != 'multipart/form-data':
+        return None
+    return options.get('boundary')
+
+class Part(object):
+    """A single part of a multipart body.
+    Properties:
+        headers - A dictionary of the part headers (names are lower case)
+        name - The name of the form field
+        filename - The name of the uploaded file (None if this is not a file field)
+        content_type - The content type of the part (None if not specified)
+    """
+    def __init__(self, reader, headers):
+        self.headers = headers
+        disposition, options = parse_options(headers.get('content-disposition'))
+        self.name = options.get('name')
+        self.filename = options.get('filename')
+        if self.filename:
+            # some browsers send the full path of the file
+            self.filename = re.split(r'[\\/]', self.filename)[-1]
+        self.content_type = headers.get('content-type')
+        self._reader = reader
+
+    def chunks(self):
+        """Returns an iterator over the content of the part.
+        Must be consumed before moving on to the next part.
+        """
+        return self._reader._part_chunks()
+
+    def read(self, max_size = MAX_FIELD_SIZE):
+        """Reads the entire content of the part into memory (e.g. for non-file form fields)
+        Args:
+            max_size - Parts larger than this are rejected with a bad request
+        """
+        data = []
+        size = 0
+        for chunk in self.chunks():
+            size += len(chunk)
+            if size > max_size:
+                raise errors.BadRequestError("form field '%s' is too large" % self.name)
+            data.append(chunk)
+        return ''.join(data)
+
+class MultipartReader(object):
+    """Parses a multipart body from an iterator of chunks"""
+
+    def __init__(self, chunks, boundary):
+        """Constructor.
+        Args:
+            chunks - An iterator over the body
+            boundary - The boundary of the body (see the 'boundary' function)
+        """
+        self._chunks = iter(chunks)
+        self._buf = ''
+        self._delimiter = '--' + boundary
+        self._separator = '\r\n--' + boundary
+        self._part_done = True
+
+    def parts(self):
+        """Returns an iterator over the parts (Part objects) of the body.
+        Parts that are not consumed by the caller are skipped.
+        """
+        self._skip_preamble()
+        while True:
+            # a delimiter followed by '--' ends the body
+            self._ensure(2)
+            if self._buf.startswith('--'):
+                return
+
+            self._part_done = False
+            yield Part(self, self._read_headers())
+            for chunk in self._part_chunks():
+                pass
+
+    def _fill(self):
+        try:
+            self._buf += self._chunks.next()
+            return True
+        except StopIteration:
+            return False
+
+    def _ensure(self, size):
+        while len(self._buf) < size:
+            if not self._fill():
+                raise errors.BadRequestError('multipart body is truncated')
+
+    def _skip_preamble(self):
+        keep = len(self._delimiter) - 1
+        while True:
+            idx = self._buf.find(self._delimiter)
+            if idx >= 0:
+                self._buf = self._buf[idx + len(self._delimiter):]
+                return
+            self._buf = self._buf[-keep:]
+            if not self._fill():
+                raise errors.BadRequestError('multipart boundary not found')
+
+    def _read_headers(self):
+        while True:
+            idx = self._buf.find('\r\n\r\n')
+            if idx >= 0:
+                break
+            if len(self._buf) > MAX_HEADERS_SIZE:
+                raise errors.BadRequestError('multipart headers are too large')
+            self._ensure(len(self._buf) + 1)
+
+        # the first line is the remainder of the delimiter line
+        lines = self._buf[:idx].split('\r\n')[1:]
+        self._buf = self._buf[idx + 4:]
+
+        headers = {}
+        for line in lines:
+            name, sep, value = line.partition(':')
+            if sep: headers[name.strip().lower()] = value.strip()
+        return headers
+
+    def _part_chunks(self):
+        separator = self._separator
+        keep = len(separator) - 1
+        while not self._part_done:
+            idx = self._buf.find(separator)
+            if idx >= 0:
+                data, self._buf = self._buf[:idx], self._buf[idx + len(separator):]
+                self._part_done = True
+            else:
+                # keep the tail of the buffer in case it is the beginning of a separator
+                split = max(0, len(self._buf) - keep)
+                data, self._buf = self._buf[:split], self._buf[split:]
+                if not self._fill():
+                    raise errors.BadRequestError('multipart body is truncated')
+            if data:
+                yield data
@@ -1,4 +1,6 @@
 from google.appengine.api import datastore_types
+import re
+import urllib
 import datetime
 
 def parse_timestamp(s):
@@ -56,6 +58,74 @@ def format_http_time(dt):
     """
     return dt.strftime(HTTP_DATE_FMT)
 
+_BYTE_RANGE_RE = re.compile(r'^\s*bytes\s*=\s*(\d*)-(\d*)\s*$', re.IGNORECASE)
+
+def parse_byte_range(value, size):
+    """Parses the value of a 'Range' header (e.g. 'bytes=0-499', 'bytes=500-' or 'bytes=-500').
+    Only a single range is supported.
+    Args:
+        value - The value of the header
+        size - The size of the entity
+    Returns:
+        A (first, last) tuple with the inclusive byte positions (first > last if the range cannot
+        be satisfied) or None if the header is invalid or specifies multiple ranges.
+    """
+    match = _BYTE_RANGE_RE.match(value)
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first: # suffix range: the last 'last' bytes
+        return max(0, size - int(last)), size - 1
+    if not last:
+        return int(first), size - 1
+    first, last = int(first), int(last)
+    if last < first:
+        return None
+    return first, min(last, size - 1)
+
+# characters that would break out of a quoted header value (or split the header)
+_UNSAFE_FILENAME_RE = re.compile(u'["\\\\\x00-\x1f\x7f]')
+_NON_ASCII_RE = re.compile(u'[^\x00-\x7f]')
+
+def format_attachment(filename):
+    """Formats the value of a 'Content-Disposition' header that sends the response as an attachment.
+    Quotes, backslashes and control characters are removed from the file name. Non-ASCII file names
+    are also sent encoded as UTF-8 (RFC 5987), with an ASCII fallback for older clients.
+    Args:
+        filename - The file name (unicode or a UTF-8 string)
+    Returns:
+        The header value (a str)
+    """
+    if not isinstance(filename, unicode): filename = str(filename).decode('utf-8', 'replace')
+    filename = _UNSAFE_FILENAME_RE.sub(u'', filename)
+    ascii_filename = _NON_ASCII_RE.sub(u'_', filename).encode('ascii')
+    value = 'attachment; filename="%s"' % ascii_filename
+    if ascii_filename != filename:
+        value += "; filename*=UTF-8''%s" % urllib.quote(filename.encode('utf-8'), safe = '')
+    return value
+
+_CONTENT_RANGE_RE = re.compile(r'^\s*bytes\s+(?:(\d+)-(\d+)|\*)/(\d+|\*)\s*$', re.IGNORECASE)
+
+def parse_content_range(value):
+    """Parses the value of a 'Content-Range' header (e.g. 'bytes 0-499/1234', 'bytes 0-499/*' or 'bytes */1234').
+    Returns:
+        A (first, last, total) tuple. first and last are None for '*' and total is None if unknown.
+        Returns None if the header is invalid.
+    """
+    match = _CONTENT_RANGE_RE.match(value)
+    if not match:
+        return None
+    first, last, total = match.groups()
+    if total == '*': total = None
+    else: total = int(total)
+    if first is None:
+        return None, None, total
+    first, last = int(first), int(last)
+    if first > last or (total is not None and last >= total):
+        return None
+    return first, last, total
 
 def to_dict(model, keyname = None):
     """Converts a model object to a dictionary
@@ -0,0 +1,31 @@
+"""Puts the restapp modules on sys.path, so tests can import them without loading webapp.
+Modules that need the App Engine SDK (e.g. utils) find it through the GOOGLE_APP_ENGINE
+environment variable (/usr/local/google_appengine by default).
+
+If the SDK is available, the restapp package is importable as well and requests can be sent
+to endpoints in-process with the benchmark harness (bench/harness.py). Tests that need the
+SDK derive from SdkTestCase and are skipped without it.
+"""
+
+import os
+import sys
+import unittest
+
+_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SDK_DIR = os.environ.get('GOOGLE_APP_ENGINE', '/usr/local/google_appengine')
+SDK_AVAILABLE = os.path.isdir(os.path.join(SDK_DIR, 'google', 'appengine'))
+
+sys.path[0:0] = [ os.path.join(_root, 'src', 'restapp'),
+                  os.path.join(_root, 'bench'),
+                  SDK_DIR ]
+
+if SDK_AVAILABLE:
+    import harness
+    harness.setup_paths(SDK_DIR)
+
+class SdkTestCase(unittest.TestCase):
+    """Base class for tests that need the App Engine SDK. Registers fresh service stubs for every test."""
+    def setUp(self):
+        if not SDK_AVAILABLE:
+            raise unittest.SkipTest('the App Engine SDK was not found in %s (set GOOGLE_APP_ENGINE)' % SDK_DIR)
+        harness.setup_stubs()
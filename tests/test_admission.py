@@ -0,0 +1,113 @@
+import unittest
+
+import paths
+import admission
+
+if paths.SDK_AVAILABLE:
+    import restapp
+    import harness
+
+    class LimitedEndpoint(restapp.Endpoint):
+        root_url = '/limited'
+        max_concurrent_requests = 1
+        rate_limit = (0.1, 2)
+
+        def get(self, ctx):
+            return ctx.resource_path
+
+class TakeTokenTest(unittest.TestCase):
+    def test_takes_tokens_until_empty(self):
+        self.assertEqual((1, 0), admission._take_token(2, 0, 0, 1, 2))
+        tokens, wait = admission._take_token(0.5, 0, 0, 2, 2)
+        self.assertEqual(0.5, tokens)
+        self.assertEqual(0.25, wait)
+
+    def test_refills_up_to_burst(self):
+        self.assertEqual((1, 0), admission._take_token(0, 0, 1000, 1, 2))
+        self.assertEqual((0.5, 0), admission._take_token(0, 0, 0.75, 2, 5))
+
+class LocalLimiterStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.store = admission.LocalLimiterStore()
+        self.now = 1000.0
+        self._time = admission.time.time
+        admission.time.time = lambda: self.now
+
+    def tearDown(self):
+        admission.time.time = self._time
+
+    def test_burst_then_rate(self):
+        self.assertEqual([ 0, 0, 0 ], [ self.store.consume_token('a', 1, 3) for i in range(3) ])
+        self.assertEqual(1, self.store.consume_token('a', 1, 3))
+        self.now += 1
+        self.assertEqual(0, self.store.consume_token('a', 1, 3))
+
+    def test_buckets_are_independent(self):
+        self.store.consume_token('a', 1, 1)
+        self.assertTrue(self.store.consume_token('a', 1, 1) > 0)
+        self.assertEqual(0, self.store.consume_token('b', 1, 1))
+
+    def test_slots(self):
+        first = self.store.acquire_slot('/books', 2)
+        second = self.store.acquire_slot('/books', 2)
+        self.assertTrue(first and second)
+        self.assertEqual(None, self.store.acquire_slot('/books', 2))
+        self.store.release_slot(first)
+        self.assertTrue(self.store.acquire_slot('/books', 2))
+
+    def test_prune_keeps_buckets_of_stricter_endpoints(self):
+        self.store.MAX_BUCKETS = 1
+        self.store.consume_token('strict', 0.01, 1)
+        self.store.consume_token('lenient', 100, 1)
+        self.now += 1
+        self.store.consume_token('other', 100, 1) # prunes: only 'lenient' is full again
+        self.assertEqual([ 'other', 'strict' ], sorted(self.store._buckets.keys()))
+        self.assertTrue(self.store.consume_token('strict', 0.01, 1) > 0)
+
+    def test_prune_drops_least_recently_used(self):
+        self.store.MAX_BUCKETS = 1
+        for key in 'abc':
+            self.store.consume_token(key, 0.01, 1)
+            self.now += 1
+        self.assertEqual([ 'b', 'c' ], sorted(self.store._buckets.keys()))
+
+    def test_prune_is_rate_limited(self):
+        self.store.MAX_BUCKETS = 1
+        for key in 'abcd':
+            self.store.consume_token(key, 0.01, 1)
+            self.now += 1
+        # 'a' was pruned when 'c' arrived, but it is too soon to prune again for 'd'
+        self.assertEqual([ 'b', 'c', 'd' ], sorted(self.store._buckets.keys()))
+        self.now += self.store.PRUNE_INTERVAL_SEC
+        self.store.consume_token('e', 0.01, 1)
+        self.assertEqual([ 'd', 'e' ], sorted(self.store._buckets.keys()))
+
+class AdmissionHandlerTest(paths.SdkTestCase):
+    def setUp(self):
+        paths.SdkTestCase.setUp(self)
+        self.store = LimitedEndpoint.limiter_store = restapp.admission.LocalLimiterStore()
+        self.app = restapp.wsgi_restapp(LimitedEndpoint)
+
+    def get(self):
+        return harness.request(self.app, 'GET', '/limited/item?alt=json')
+
+    def test_rate_limited_requests_get_429(self):
+        self.assertEqual(200, self.get()[0])
+        self.assertEqual(200, self.get()[0])
+        status, headers, body = self.get()
+        self.assertEqual(429, status)
+        self.assertEqual('10', headers['Retry-After']) # a token is added every 10 seconds
+        self.assertEqual('no-cache', headers['Cache-Control'])
+        self.assertEqual({}, self.store._slots) # rejected requests release their slot
+
+    def test_saturated_endpoint_gets_503(self):
+        slot = self.store.acquire_slot(LimitedEndpoint.get_root_url(), 1)
+        status, headers, body = self.get()
+        self.assertEqual(503, status)
+        self.assertEqual(str(LimitedEndpoint.saturated_retry_after), headers['Retry-After'])
+        self.store.release_slot(slot)
+        self.assertEqual(200, self.get()[0])
+        self.assertEqual({}, self.store._slots)
+
+if __name__ == '__main__':
+    unittest.main()
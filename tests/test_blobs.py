@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import paths
+import blobs
+
+class FileSystemBlobStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = blobs.FileSystemBlobStore(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def upload(self, data):
+        upload_key = self.store.create('text/plain', u'r\xe9sum\xe9.txt')
+        self.assertEqual(len(data), self.store.append(upload_key, 0, iter([ data ])))
+        return upload_key
+
+    def test_upload(self):
+        upload_key = self.upload('hello')
+        self.assertEqual(5, self.store.uploaded_size(upload_key))
+        self.assertEqual(5, self.store.append(upload_key, 3, iter([ 'ignored' ]))) # does not continue the upload
+        self.assertEqual(11, self.store.append(upload_key, 5, iter([ ' ', 'world' ])))
+
+        blob = self.store.finalize(upload_key)
+        self.assertEqual((upload_key, 11, 'text/plain', u'r\xe9sum\xe9.txt'),
+                         (blob.key, blob.size, blob.content_type, blob.filename))
+        self.assertEqual('hello world', self.store.open(upload_key).read())
+        self.assertEqual(11, self.store.uploaded_size(upload_key))
+        self.assertEqual(upload_key, self.store.finalize(upload_key).key)
+
+    def test_only_created_keys_are_uploads(self):
+        f = open(os.path.join(self.root, 'other.txt'), 'wb')
+        f.write('not an upload')
+        f.close()
+        self.assertEqual(None, self.store.uploaded_size('other.txt'))
+        self.assertEqual(None, self.store.append('other.txt', 13, iter([ 'data' ])))
+        self.assertEqual(None, self.store.finalize('other.txt'))
+        self.assertEqual(None, self.store.complete('other.txt', lambda blob: self.fail('not an upload')))
+        self.assertEqual(None, self.store.uploaded_size('../other.txt'))
+
+    def test_complete_calls_handler_once(self):
+        upload_key = self.upload('hello')
+        calls = []
+        def handler(blob):
+            calls.append(blob.key)
+            return '/files/%s' % blob.key
+        self.assertEqual('/files/%s' % upload_key, self.store.complete(upload_key, handler))
+        self.assertEqual('/files/%s' % upload_key, self.store.complete(upload_key, handler))
+        self.assertEqual([ upload_key ], calls)
+        self.assertEqual(u'r\xe9sum\xe9.txt', self.store.stat(upload_key).filename)
+
+    def test_complete_while_completing(self):
+        upload_key = self.upload('hello')
+        self.assertEqual('done', self.store.complete(upload_key,
+                                 lambda blob: self.store.complete(upload_key, lambda blob: 'again') or 'done'))
+
+    def test_failed_handler_can_be_retried(self):
+        upload_key = self.upload('hello')
+        def fail(blob):
+            raise ValueError('failed')
+        self.assertRaises(ValueError, self.store.complete, upload_key, fail)
+        self.assertEqual('done', self.store.complete(upload_key, lambda blob: 'done'))
+
+    def test_delete_upload(self):
+        upload_key = self.upload('hello')
+        self.store.finalize(upload_key)
+        self.store.delete_upload(upload_key)
+        self.assertEqual(None, self.store.stat(upload_key))
+        self.assertEqual(None, self.store.uploaded_size(upload_key))
+        self.assertEqual([], os.listdir(self.root))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import paths
+
+if paths.SDK_AVAILABLE:
+    import restapp
+    import harness
+    from restapp import blobs
+
+    class BlobsEndpoint(restapp.Endpoint):
+        root_url = '/blobs'
+
+        def get(self, ctx):
+            return ctx.resource_path
+
+        def alt_blob(self, ctx, blob_key):
+            ctx.send_blob(blob_key, save_as = bool(ctx.argument('save_as')), immutable = not ctx.argument('mutable'))
+
+class SendBlobTest(paths.SdkTestCase):
+    def setUp(self):
+        paths.SdkTestCase.setUp(self)
+        self.root = tempfile.mkdtemp()
+        self.store = BlobsEndpoint.blob_store = blobs.FileSystemBlobStore(self.root)
+        self.app = restapp.wsgi_restapp(BlobsEndpoint)
+        self.write('data.bin', '0123456789', 1000000000)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, key, data, mtime):
+        path = self.store.path(key)
+        f = open(path, 'wb')
+        try:
+            f.write(data)
+        finally:
+            f.close()
+        os.utime(path, (mtime, mtime))
+
+    def get(self, query = '', **headers):
+        return harness.request(self.app, 'GET', '/blobs/data.bin?alt=blob' + query,
+                               headers = dict([ (k.replace('_', '-'), v) for k, v in headers.items() ]))
+
+    def test_entire_blob(self):
+        status, headers, body = self.get()
+        self.assertEqual(200, status)
+        self.assertEqual('0123456789', body)
+        self.assertEqual('"data.bin"', headers['ETag'])
+        self.assertEqual('bytes', headers['Accept-Ranges'])
+        self.assertTrue(headers['Cache-Control'].startswith('max-age='))
+
+    def test_range(self):
+        status, headers, body = self.get(Range = 'bytes=2-5')
+        self.assertEqual(206, status)
+        self.assertEqual('bytes 2-5/10', headers['Content-Range'])
+        self.assertEqual('2345', body)
+
+        status, headers, body = self.get(Range = 'bytes=-3')
+        self.assertEqual(206, status)
+        self.assertEqual('789', body)
+
+    def test_unsatisfiable_range(self):
+        status, headers, body = self.get(Range = 'bytes=10-')
+        self.assertEqual(416, status)
+        self.assertEqual('bytes */10', headers['Content-Range'])
+
+    def test_if_none_match(self):
+        status, headers, body = self.get(If_None_Match = '"other", "data.bin"')
+        self.assertEqual(304, status)
+        self.assertEqual('', body)
+        self.assertTrue(headers['Cache-Control'].startswith('max-age=')) # not replaced by no-cache
+
+    def test_if_range(self):
+        status, headers, body = self.get(Range = 'bytes=2-5', If_Range = '"data.bin"')
+        self.assertEqual(206, status)
+        self.assertEqual('2345', body)
+
+        status, headers, body = self.get(Range = 'bytes=2-5', If_Range = '"other"')
+        self.assertEqual(200, status)
+        self.assertEqual('0123456789', body)
+
+    def test_replaced_mutable_blob_gets_a_new_etag(self):
+        etag = self.get('&mutable=1')[1]['ETag']
+        self.assertNotEqual('"data.bin"', etag)
+        self.assertEqual(304, self.get('&mutable=1', If_None_Match = etag)[0])
+
+        self.write('data.bin', 'abcdefghij', 1000000001) # same size, new content
+        status, headers, body = self.get('&mutable=1', If_None_Match = etag)
+        self.assertEqual(200, status)
+        self.assertEqual('abcdefghij', body)
+        self.assertNotEqual(etag, headers['ETag'])
+
+        # a range of the old blob must not be resumed with bytes of the new one
+        status, headers, body = self.get('&mutable=1', Range = 'bytes=5-', If_Range = etag)
+        self.assertEqual(200, status)
+        self.assertEqual('abcdefghij', body)
+
+    def test_save_as_uploaded_file_name(self):
+        upload_key = self.store.create('text/plain', u'a"b\rc\xe9.txt')
+        self.store.append(upload_key, 0, iter([ 'hello' ]))
+        blob = self.store.finalize(upload_key)
+
+        status, headers, body = harness.request(self.app, 'GET', '/blobs/%s?alt=blob&save_as=1' % blob.key)
+        self.assertEqual(200, status)
+        self.assertEqual('hello', body)
+        self.assertEqual('text/plain', headers['Content-Type'])
+        self.assertEqual('attachment; filename="abc_.txt"; filename*=UTF-8\'\'abc%C3%A9.txt', headers['Content-Disposition'])
+
+    def test_missing_blob(self):
+        self.assertEqual(404, harness.request(self.app, 'GET', '/blobs/missing.bin?alt=blob')[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import paths
+
+if paths.SDK_AVAILABLE:
+    import restapp
+    import harness
+    from restapp import blobs
+
+    class UploadsEndpoint(restapp.Endpoint):
+        root_url = '/uploads'
+        direct_uploads = True
+        uploaded = []
+
+        def upload(self, ctx):
+            blob = ctx.get_uploads('file')[0]
+            UploadsEndpoint.uploaded.append(blob.key)
+            return blob.key
+
+class ResumableUploadTest(paths.SdkTestCase):
+    def setUp(self):
+        paths.SdkTestCase.setUp(self)
+        self.root = tempfile.mkdtemp()
+        self.store = UploadsEndpoint.blob_store = blobs.FileSystemBlobStore(self.root)
+        UploadsEndpoint.uploaded = []
+        self.app = restapp.wsgi_restapp(UploadsEndpoint)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def start(self):
+        status, headers, body = harness.request(self.app, 'POST', '/uploads/__upload?resumable=1',
+                                                headers = { 'X-Upload-Content-Type': 'text/plain',
+                                                            'X-Upload-Filename': 'hello.txt' })
+        self.assertEqual(201, status)
+        return headers['Location'][headers['Location'].index('/uploads/__upload/'):]
+
+    def put(self, path, content_range, body = ''):
+        return harness.request(self.app, 'PUT', path, body = body, headers = { 'Content-Range': content_range })
+
+    def test_upload_in_chunks(self):
+        path = self.start()
+        upload_key = path.rsplit('/', 1)[-1]
+
+        status, headers, body = self.put(path, 'bytes 0-5/11', 'hello ')
+        self.assertEqual(308, status)
+        self.assertEqual('bytes=0-5', headers['Range'])
+
+        status, headers, body = self.put(path, 'bytes */11')
+        self.assertEqual(308, status)
+        self.assertEqual('bytes=0-5', headers['Range'])
+
+        # a chunk that does not continue the upload is ignored
+        status, headers, body = self.put(path, 'bytes 3-5/11', 'lo ')
+        self.assertEqual(308, status)
+        self.assertEqual('bytes=0-5', headers['Range'])
+
+        status, headers, body = self.put(path, 'bytes 6-10/11', 'world')
+        self.assertEqual(302, status)
+        self.assertTrue(headers['Location'].endswith('/uploads/' + upload_key))
+        self.assertEqual([ upload_key ], UploadsEndpoint.uploaded)
+        self.assertEqual('hello world', self.store.open(upload_key).read())
+        self.assertEqual('text/plain', self.store.stat(upload_key).content_type)
+
+        # replays of a completed upload get the same redirect without calling 'upload' again
+        for content_range, chunk in (('bytes 6-10/11', 'world'), ('bytes */11', '')):
+            status, headers, body = self.put(path, content_range, chunk)
+            self.assertEqual(302, status)
+            self.assertTrue(headers['Location'].endswith('/uploads/' + upload_key))
+        self.assertEqual([ upload_key ], UploadsEndpoint.uploaded)
+
+    def test_entire_body(self):
+        path = self.start()
+        status, headers, body = harness.request(self.app, 'PUT', path, body = 'hello')
+        self.assertEqual(302, status)
+        self.assertEqual('hello', self.store.open(path.rsplit('/', 1)[-1]).read())
+
+    def test_unknown_upload(self):
+        f = open(os.path.join(self.root, 'stored.txt'), 'wb')
+        f.write('someone else\'s blob')
+        f.close()
+        for upload_key in ('stored.txt', 'missing'):
+            status, headers, body = self.put('/uploads/__upload/' + upload_key, 'bytes */1')
+            self.assertEqual(404, status)
+        self.assertEqual([], UploadsEndpoint.uploaded)
+
+    def test_content_range_must_match_body(self):
+        path = self.start()
+        self.assertEqual(400, self.put(path, 'bytes 0-9/11', 'hello')[0])
+        self.assertEqual(400, self.put(path, 'bytes 0-4', 'hello')[0])
+
+if __name__ == '__main__':
+    unittest.main()
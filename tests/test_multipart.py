@@ -0,0 +1,81 @@
+import unittest
+
+import paths
+import errors
+import multipart
+
+BODY = ('preamble\r\n'
+        '--XyZ\r\n'
+        'Content-Disposition: form-data; name="title"\r\n'
+        '\r\n'
+        'hello\r\n'
+        '--XyZ\r\n'
+        'Content-Disposition: form-data; name="file"; filename="C:\\photos\\a;b.jpg"\r\n'
+        'Content-Type: image/jpeg\r\n'
+        '\r\n'
+        + ('data\r\n--Xy' * 100) +
+        '\r\n--XyZ\r\n'
+        'Content-Disposition: form-data; name="skipped"; filename="x.bin"\r\n'
+        '\r\n'
+        'not read\r\n'
+        '--XyZ--\r\n'
+        'epilogue')
+
+def split(data, size):
+    return [ data[i:i + size] for i in range(0, len(data), size) ]
+
+def read_all(chunks, boundary = 'XyZ'):
+    """Returns (name, filename, content_type, content) for every part except 'skipped'"""
+    result = []
+    for part in multipart.MultipartReader(chunks, boundary).parts():
+        if part.name == 'skipped': continue
+        result.append((part.name, part.filename, part.content_type, ''.join(part.chunks())))
+    return result
+
+class ParseOptionsTest(unittest.TestCase):
+    def test_quoted_options(self):
+        value, options = multipart.parse_options('form-data; name="file"; filename="a;b.jpg"')
+        self.assertEqual('form-data', value)
+        self.assertEqual({ 'name': 'file', 'filename': 'a;b.jpg' }, options)
+
+    def test_boundary(self):
+        self.assertEqual('XyZ', multipart.boundary('multipart/form-data; boundary=XyZ'))
+        self.assertEqual('XyZ', multipart.boundary('Multipart/Form-Data; boundary="XyZ"'))
+        self.assertEqual(None, multipart.boundary('application/x-www-form-urlencoded'))
+        self.assertEqual(None, multipart.boundary(None))
+
+class MultipartReaderTest(unittest.TestCase):
+    def test_parts(self):
+        self.assertEqual([ ('title', None, None, 'hello'),
+                           ('file', 'a;b.jpg', 'image/jpeg', 'data\r\n--Xy' * 100) ],
+                         read_all([ BODY ]))
+
+    def test_chunk_boundaries(self):
+        # every split of the body must produce the same parts, including splits inside delimiters
+        expected = read_all([ BODY ])
+        for size in range(1, 20) + [ 64, 1000 ]:
+            self.assertEqual(expected, read_all(split(BODY, size)), 'chunk size %d' % size)
+
+    def test_part_chunks_are_bounded(self):
+        parts = multipart.MultipartReader(split(BODY, 7), 'XyZ').parts()
+        parts.next().read()
+        for chunk in parts.next().chunks():
+            self.assertTrue(len(chunk) <= 7)
+
+    def test_empty_part(self):
+        body = '--b\r\nContent-Disposition: form-data; name="empty"\r\n\r\n\r\n--b--\r\n'
+        self.assertEqual([ ('empty', None, None, '') ], read_all([ body ], 'b'))
+
+    def test_truncated_body(self):
+        self.assertRaises(errors.RequestError, read_all, [ BODY[:BODY.index('--XyZ--')] ])
+        self.assertRaises(errors.RequestError, read_all, [ BODY[:40] ])
+
+    def test_missing_boundary(self):
+        self.assertRaises(errors.RequestError, read_all, [ 'no boundary here' ])
+
+    def test_field_size_limit(self):
+        part = multipart.MultipartReader([ BODY ], 'XyZ').parts().next()
+        self.assertRaises(errors.RequestError, part.read, 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+
+import paths
+if paths.SDK_AVAILABLE:
+    import utils
+
+class ParseByteRangeTest(paths.SdkTestCase):
+    def test_ranges(self):
+        self.assertEqual((0, 499), utils.parse_byte_range('bytes=0-499', 1000))
+        self.assertEqual((500, 999), utils.parse_byte_range('bytes=500-', 1000))
+        self.assertEqual((900, 999), utils.parse_byte_range('bytes=-100', 1000))
+        self.assertEqual((0, 999), utils.parse_byte_range('bytes=-5000', 1000))
+        self.assertEqual((500, 999), utils.parse_byte_range('Bytes = 500-2000', 1000))
+
+    def test_unsatisfiable(self):
+        first, last = utils.parse_byte_range('bytes=1000-', 1000)
+        self.assertTrue(first > last)
+        first, last = utils.parse_byte_range('bytes=-0', 1000)
+        self.assertTrue(first > last)
+
+    def test_invalid_ranges_are_ignored(self):
+        for value in ('bytes=--5', 'bytes=-', 'bytes=5', 'bytes=10-5', 'bytes=0-1,5-6',
+                      'items=0-5', 'bytes=a-b', 'bytes=-5-'):
+            self.assertEqual(None, utils.parse_byte_range(value, 100), value)
+
+class FormatAttachmentTest(paths.SdkTestCase):
+    def test_ascii(self):
+        self.assertEqual('attachment; filename="a b.txt"', utils.format_attachment('a b.txt'))
+
+    def test_unsafe_characters_are_removed(self):
+        self.assertEqual('attachment; filename="abc.txt"', utils.format_attachment(u'a"b\r\n\\c.txt'))
+
+    def test_non_ascii(self):
+        value = utils.format_attachment(u'r\xe9sum\xe9 "1".pdf')
+        self.assertTrue(isinstance(value, str))
+        self.assertEqual('attachment; filename="r_sum_ 1.pdf"; filename*=UTF-8\'\'r%C3%A9sum%C3%A9%201.pdf', value)
+        self.assertEqual(value, utils.format_attachment(u'r\xe9sum\xe9 "1".pdf'.encode('utf-8')))
+
+class ParseContentRangeTest(paths.SdkTestCase):
+    def test_ranges(self):
+        self.assertEqual((0, 499, 1234), utils.parse_content_range('bytes 0-499/1234'))
+        self.assertEqual((500, 999, None), utils.parse_content_range('bytes 500-999/*'))
+        self.assertEqual((None, None, 1234), utils.parse_content_range('bytes */1234'))
+
+    def test_invalid(self):
+        for value in ('bytes 0-499', 'bytes 5-4/10', 'bytes 0-10/10', 'bytes 1--3/10',
+                      'bytes */-5', 'bytes -1-3/10', 'items 0-4/5', 'bytes=0-4/5', ''):
+            self.assertEqual(None, utils.parse_content_range(value), value)
+
+if __name__ == '__main__':
+    unittest.main()